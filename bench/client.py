@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+'''Compares ways for a Python program to drive a running polydown
+server: running the pdc script for every request, pdc.Client from
+several threads, pdc.Client.pipeline() and pdc.AsyncClient with many
+tasks. Every request is "c @bench_client +1", so the counter also shows
+whether all of them got through.'''
+
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import threading
+from time import perf_counter
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+import pdc
+
+EXPR = '@bench_client +1'
+
+def fork(port, count):
+    cmd = [sys.executable, os.path.join(ROOT, 'pdc'), *(['-p', str(port)] if port else []),
+           'c', *EXPR.split()]
+    for _ in range(count):
+        subprocess.run(cmd, stdout=subprocess.DEVNULL, check=True)
+
+def threads(port, count, concurrency):
+    with pdc.Client(port, size=concurrency) as client:
+        def work(n):
+            for _ in range(n):
+                client.counter(EXPR)
+        workers = [threading.Thread(target=work, args=(count // concurrency,))
+                   for _ in range(concurrency)]
+        for t in workers:
+            t.start()
+        for t in workers:
+            t.join()
+
+def pipeline(port, count, concurrency):
+    with pdc.Client(port) as client:
+        client.pipeline([pdc.build_message(f'c {EXPR}')] * count, depth=concurrency)
+
+def tasks(port, count, concurrency):
+    async def run():
+        async with pdc.AsyncClient(port, size=max(1, concurrency // 16)) as client:
+            async def work(n):
+                for _ in range(n):
+                    await client.counter(EXPR)
+            await asyncio.gather(*(work(count // concurrency) for _ in range(concurrency)))
+    asyncio.run(run())
+
+MODES = {'fork': fork, 'threads': threads, 'pipeline': pipeline, 'async': tasks}
+
+def counter(port):
+    with pdc.Client(port) as client:
+        return float(client.cat('@bench_client')[0])
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('-n', '--count', type=int, default=10000, help='requests per mode')
+    parser.add_argument('-f', '--fork-count', type=int, default=100,
+                        help='requests for the fork mode, which is much slower')
+    parser.add_argument('-c', '--concurrency', type=int, default=64,
+                        help='threads, requests in flight or tasks')
+    parser.add_argument('-m', '--modes', nargs='+', default=list(MODES), choices=MODES)
+    parser.add_argument('-p', '--port', type=int, help='use TCP instead of the Unix socket')
+    args = parser.parse_args()
+
+    for mode in args.modes:
+        with pdc.Client(args.port) as client:
+            client.counter('@bench_client 0')
+        if mode == 'fork':
+            count = args.fork_count
+            start = perf_counter()
+            fork(args.port, count)
+        else:
+            count = args.count // args.concurrency * args.concurrency
+            start = perf_counter()
+            MODES[mode](args.port, count, args.concurrency)
+        elapsed = perf_counter() - start
+        print(f'{mode:9} {count / elapsed:10.1f} requests/s  {count - counter(args.port):g} lost')
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+'''Measures how many counter increments per second a running polydown
+server applies when N clients bump counters concurrently, and checks
+that none of them got lost.
+
+Every client sends "c @bench_K +1" messages, spreading them over
+--counters counters. By default each message is a one-shot connection,
+with --session clients pipeline --depth messages over one framed
+connection, and with --multi every message bumps all counters at once.'''
+
+import argparse
+import os
+import sys
+import threading
+from time import monotonic
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import pdc
+
+def message(counters, multi, i):
+    if multi:
+        targets = range(counters)
+    else:
+        targets = [i % counters]
+    return pdc.convert('c ' + ' '.join(f'@bench_{k} +1' for k in targets))
+
+def client(port, counters, multi, deadline, counts, i):
+    done = 0
+    while monotonic() < deadline:
+        sock = pdc.connect(port)
+        sock.send(message(counters, multi, done).encode())
+        sock.recv(65536)
+        sock.close()
+        done += 1
+    counts[i] = done
+
+def session_client(port, counters, multi, deadline, counts, i, depth):
+    done = 0
+    with pdc.Session(port) as session:
+        while monotonic() < deadline:
+            ids = [session.submit(message(counters, multi, done + j)) for j in range(depth)]
+            for request_id in ids:
+                session.collect(request_id)
+            done += depth
+    counts[i] = done
+
+def total(port, counters):
+    with pdc.Session(port) as session:
+        _, data = session.request(pdc.convert('cat ' + ' '.join(f'@bench_{k}' for k in range(counters))))
+    return sum(float(v) for v in data.split())
+
+def run(port, clients, seconds, counters, multi, depth=None):
+    '''Returns (increments per second, increments lost)'''
+    with pdc.Session(port) as session:
+        session.request(pdc.convert('c ' + ' '.join(f'@bench_{k} 0' for k in range(counters))))
+    counts = [0] * clients
+    deadline = monotonic() + seconds
+    target, extra = (client, ()) if depth is None else (session_client, (depth,))
+    threads = [threading.Thread(target=target, args=(port, counters, multi, deadline, counts, i, *extra))
+               for i in range(clients)]
+    start = monotonic()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = monotonic() - start
+    sent = sum(counts) * (counters if multi else 1)
+    return sent / elapsed, sent - total(port, counters)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('-c', '--clients', type=int, nargs='+', default=[1, 4, 16, 64])
+    parser.add_argument('-t', '--time', type=float, default=3, help='seconds per run')
+    parser.add_argument('-n', '--counters', type=int, default=4, help='counters to spread increments over')
+    parser.add_argument('-m', '--multi', action='store_true', help='bump every counter in each message')
+    parser.add_argument('-p', '--port', type=int, help='use TCP instead of the Unix socket')
+    parser.add_argument('-s', '--session', action='store_true', help='use persistent framed sessions')
+    parser.add_argument('-d', '--depth', type=int, default=16, help='pipelined requests per session')
+    args = parser.parse_args()
+
+    for n in args.clients:
+        depth = args.depth if args.session else None
+        rate, lost = run(args.port, n, args.time, args.counters, args.multi, depth)
+        print(f'{n:5} clients  {rate:10.1f} increments/s  {lost:g} lost')
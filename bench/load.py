@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+'''Starts a private polydown server, fills it with N objects and drives it
+with C concurrent clients running a workload, for every combination of
+the given object and client counts.
+
+Each run prints one JSON object per line to stdout (or --json FILE):
+throughput and p50/p99 latency per operation and overall, plus the
+server's RSS and CPU usage during the run, so that results can be
+compared between commits. A readable summary goes to stderr.
+
+Workloads:
+    add      add a timer labelled @bench_tmp
+    ls       list every object
+    cat      cat @lK for a random K, each label has N/100 objects
+    counter  c @bench_hits +1
+    rm       rm @bench_tmp, removing what "add" added
+    mixed    all of the above, weighted towards add, cat and counter
+
+Every run ends with "rm *", timed once. The server runs with HOME set
+to a temporary directory, but its sockets and status page live in
+/tmp/polydown, so no other server may be running meanwhile.'''
+
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import subprocess
+import sys
+import tempfile
+from time import monotonic, perf_counter, sleep
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+import pdc
+
+OPERATIONS = {
+    'add'    : lambda rng: pdc.convert('@bench_tmp 1d'),
+    'ls'     : lambda rng: pdc.convert('ls'),
+    'cat'    : lambda rng: pdc.convert('cat @l{}'.format(rng.randrange(100))),
+    'counter': lambda rng: pdc.convert('c @bench_hits +1'),
+    'rm'     : lambda rng: pdc.convert('rm @bench_tmp'),
+}
+MIXED = {'add': 30, 'ls': 1, 'cat': 30, 'counter': 35, 'rm': 4}
+
+def start_server(home, port, server_args):
+    try:
+        pdc.connect(port).close()
+        sys.exit('A polydown server is already running, stop it first')
+    except (ConnectionError, FileNotFoundError):
+        pass
+    cmd = [sys.executable, os.path.join(ROOT, 'polydown'), *server_args]
+    if port is not None:
+        cmd[2:2] = ['-p', str(port)]
+    proc = subprocess.Popen(cmd, env=dict(os.environ, HOME=home),
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = monotonic() + 30
+    while monotonic() < deadline:
+        try:
+            pdc.connect(port).close()
+            return proc
+        except (ConnectionError, FileNotFoundError):
+            sleep(0.05)
+    proc.kill()
+    sys.exit('The server did not come up')
+
+def stop_server(proc, port):
+    with pdc.Session(port) as session:
+        session.request(pdc.convert('kill'))
+    proc.wait()
+
+def populate(port, count, chunk=10000):
+    '''Adds count timers, stopwatches and alarms over one connection'''
+    kinds = ('@l{} 1d', '@l{} s 1h', '@l{} +2d')
+    with pdc.Session(port) as session:
+        for begin in range(0, count, chunk):
+            session.batch([pdc.convert(kinds[i % 3].format(i % 100))
+                           for i in range(begin, min(count, begin + chunk))])
+
+def process_stats(pid):
+    '''(RSS in bytes, CPU seconds) of a process, None where unavailable'''
+    rss = cpu = None
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    rss = int(line.split()[1]) * 1024
+        with open(f'/proc/{pid}/stat') as f:
+            fields = f.read().rpartition(')')[2].split()
+            cpu = (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK')
+    except OSError:
+        pass
+    return rss, cpu
+
+def client(port, workload, seconds, seed):
+    '''Runs requests back to back, returns {operation: [latencies]}'''
+    rng = random.Random(seed)
+    ops, weights = zip(*(MIXED.items() if workload == 'mixed' else [(workload, 1)]))
+    latencies = {op: [] for op in ops}
+    with pdc.Session(port) as session:
+        deadline = monotonic() + seconds
+        while monotonic() < deadline:
+            op = rng.choices(ops, weights)[0]
+            msg = OPERATIONS[op](rng)
+            start = perf_counter()
+            session.request(msg)
+            latencies[op].append(perf_counter() - start)
+    return latencies
+
+def summarize(samples, elapsed):
+    samples = sorted(samples)
+    if not samples:
+        return {'count': 0}
+    ms = lambda q: samples[min(len(samples) - 1, int(q * len(samples)))] * 1e3
+    return {
+        'count': len(samples),
+        'throughput': len(samples) / elapsed,
+        'mean_ms': sum(samples) / len(samples) * 1e3,
+        'p50_ms': ms(0.5),
+        'p99_ms': ms(0.99),
+    }
+
+def run(pool, port, server_pid, objects, clients, workload, seconds):
+    rss_before, cpu_before = process_stats(server_pid)
+    start = monotonic()
+    results = pool.starmap(client, [(port, workload, seconds, i) for i in range(clients)])
+    elapsed = monotonic() - start
+    rss_after, cpu_after = process_stats(server_pid)
+
+    latencies = {}
+    for result in results:
+        for op, samples in result.items():
+            latencies.setdefault(op, []).extend(samples)
+    return {
+        'objects': objects,
+        'clients': clients,
+        'workload': workload,
+        'seconds': elapsed,
+        'total': summarize([s for samples in latencies.values() for s in samples], elapsed),
+        'operations': {op: summarize(samples, elapsed) for op, samples in latencies.items()},
+        'server': {
+            'rss_before': rss_before,
+            'rss_after': rss_after,
+            'cpu_percent': None if cpu_before is None else (cpu_after - cpu_before) / elapsed * 100,
+        },
+    }
+
+def commit():
+    try:
+        return subprocess.run(['git', '-C', ROOT, 'rev-parse', '--short', 'HEAD'],
+                              capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('-o', '--objects', type=int, nargs='+', default=[10, 1000, 100000],
+                        help='object counts, e.g. 10 1000 100000 1000000')
+    parser.add_argument('-c', '--clients', type=int, nargs='+', default=[1, 8, 32])
+    parser.add_argument('-w', '--workload', nargs='+', default=['mixed'],
+                        choices=['mixed', *OPERATIONS])
+    parser.add_argument('-t', '--time', type=float, default=5, help='seconds per run')
+    parser.add_argument('-p', '--port', type=int, help='use TCP instead of the Unix socket')
+    parser.add_argument('--json', type=argparse.FileType('w'), default=sys.stdout,
+                        help='where to write results, default is stdout')
+    parser.add_argument('--server-args', default='', help='extra polydown arguments')
+    args = parser.parse_args()
+
+    revision = commit()
+    pool = multiprocessing.Pool(max(args.clients))
+    for objects in args.objects:
+        with tempfile.TemporaryDirectory() as home:
+            server = start_server(home, args.port, args.server_args.split())
+            try:
+                populate(args.port, objects)
+                for workload in args.workload:
+                    for clients in args.clients:
+                        result = run(pool, args.port, server.pid, objects, clients, workload, args.time)
+                        result['commit'] = revision
+                        print(json.dumps(result), file=args.json, flush=True)
+                        total = result['total']
+                        print(f'{objects:8} objects {clients:4} clients {workload:8} '
+                              f'{total.get("throughput", 0):10.1f} req/s  '
+                              f'p50 {total.get("p50_ms", 0):8.3f}ms  p99 {total.get("p99_ms", 0):8.3f}ms  '
+                              f'rss {(result["server"]["rss_after"] or 0) / 2**20:7.1f}MiB  '
+                              f'cpu {result["server"]["cpu_percent"] or 0:5.1f}%', file=sys.stderr)
+
+                with pdc.Session(args.port) as session:
+                    start = perf_counter()
+                    session.request(pdc.convert('rm *'))
+                    elapsed = perf_counter() - start
+                print(json.dumps({'objects': objects, 'workload': 'rm *', 'seconds': elapsed,
+                                  'commit': revision}), file=args.json, flush=True)
+                print(f'{objects:8} objects  rm * took {elapsed * 1e3:.1f}ms', file=sys.stderr)
+            finally:
+                stop_server(server, args.port)
+    pool.close()
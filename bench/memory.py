@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+'''Measures how much memory the server needs per object.
+
+Creates N long-lived objects, mostly labelled stopwatches and counters
+with a few timers, and keeps them the same way polydown does: in the
+registry and, where they have a deadline, in the scheduler. Reports
+the bytes allocated per object as traced by tracemalloc, and the growth
+of the process RSS.'''
+
+import argparse
+import gc
+import os
+import sys
+import tracemalloc
+from importlib.machinery import SourceFileLoader
+from time import monotonic
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+polydown = SourceFileLoader('polydown', os.path.join(ROOT, 'polydown')).load_module()
+
+def rss():
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1]) * 1024
+    return 0
+
+def populate(count):
+    registry, scheduler = polydown.Registry(), polydown.Scheduler()
+    now = monotonic()
+    for i in range(count):
+        kind = (0, 2, 2, 3, 3)[i % 5]
+        # Labels are built at runtime, like the ones parsed off requests
+        obj = polydown.TimeObject(kind, '@group{}'.format(i % 50), None)
+        if kind == 0:
+            obj.start, obj.deadline = now, now + 86400 + i
+        elif kind == 2:
+            obj.start = now - i
+        else:
+            obj.value = float(i)
+        registry.add(obj)
+        if obj.deadline is not None:
+            scheduler.add(obj)
+    return registry, scheduler
+
+def bench(count):
+    gc.collect()
+    rss_before = rss()
+    tracemalloc.start()
+    kept = populate(count)
+    traced, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    rss_after = rss()
+    del kept
+    return traced / count, (rss_after - rss_before) / count
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('-n', '--count', type=int, nargs='+', default=[1000, 100000, 1000000])
+    args = parser.parse_args()
+
+    for n in args.count:
+        traced, resident = bench(n)
+        print(f'{n:8} objects  {traced:7.1f} bytes/object traced  {resident:7.1f} bytes/object RSS')
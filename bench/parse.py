@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+'''Measures how fast pdc turns "add" expressions into server messages,
+which is where "pdc -i FILE" spends its time on large imports.
+
+Runs convert() over a corpus of timer, alarm, stopwatch and counter
+expressions (or over the lines of a file) and reports the throughput.'''
+
+import argparse
+import contextlib
+import io
+import os
+import sys
+from time import perf_counter
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import pdc
+
+CORPUS = [
+    '5', '1h 2m 3s', '2m 1d 5s', '2.5h 4 4', '4.5s', '@tea 3m -- notify-send tea',
+    '+12m 180s', '+ 5m', '+1h -- echo alarm',
+    '5pm', '17:00', '7:30:15am', '25.06 13:15', '12/23/2055 7:30:15am', '1.2', '5/3 8',
+    '2055-12-23 7:30', '29.2', '2030-1', '8.3 12am',
+    's', 's 100', 's 1h 3m', '@build s',
+    'c 0', 'c 2 +1', 'c @hits + 5', 'c @abc 0', 'c 1 %4', 'c 4 *2.5',
+    'ls', 'rm 3 @tea', 'cat :', 'stat 0:5',
+    'nonsense', '99:99', '31.2',
+]
+
+def run(lines, rounds):
+    # Error messages are part of convert(), but not of this benchmark
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = perf_counter()
+        for _ in range(rounds):
+            for line in lines:
+                pdc.convert(line)
+        return perf_counter() - start
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('-f', '--file', help='parse lines of this file instead of the corpus')
+    parser.add_argument('-r', '--rounds', type=int, default=2000)
+    args = parser.parse_args()
+
+    lines = CORPUS
+    if args.file:
+        with open(args.file) as f:
+            lines = [line.strip() for line in f if line.strip()]
+    seconds = run(lines, args.rounds)
+    count = len(lines) * args.rounds
+    print(f'{count} expressions in {seconds:.3f}s: {count / seconds:,.0f}/s, '
+          f'{seconds / count * 1e6:.2f}us each')
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+'''Times how long the server takes to restore its objects at startup.
+
+Writes a snapshot of N mixed objects plus a journal of further changes
+into a temporary directory, then restores them the same way polydown
+does: Journal.restore() followed by loading the registry and scheduler.'''
+
+import argparse
+import os
+import sys
+import tempfile
+from importlib.machinery import SourceFileLoader
+from time import perf_counter, time, monotonic
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+polydown = SourceFileLoader('polydown', os.path.join(ROOT, 'polydown')).load_module()
+
+def make_objects(count):
+    now = monotonic()
+    for i in range(count):
+        obj = polydown.TimeObject(i % 4, '@l{}'.format(i % 100) if i % 3 else None,
+                                  'notify-send done' if i % 5 == 0 else None)
+        if obj.kind == 0:
+            obj.start, obj.deadline = now, now + 3600 + i
+        elif obj.kind == 1:
+            obj.alarm_at = float(int(time()) + 86400 + i)
+        elif obj.kind == 2:
+            obj.start = now - i
+        else:
+            obj.value = float(i)
+        obj.index = i
+        yield obj
+
+def bench(count, journal_ops):
+    with tempfile.TemporaryDirectory() as tmp:
+        journal = polydown.Journal(os.path.join(tmp, 'snapshot'), os.path.join(tmp, 'journal'))
+        journal.compact(make_objects(count))
+        for obj in make_objects(journal_ops):
+            journal.save(obj)
+        journal.flush()
+        journal.file.close()
+        size = os.path.getsize(journal.snapshot_path) + os.path.getsize(journal.journal_path)
+
+        start = perf_counter()
+        objs = journal.restore()
+        polydown.Registry().load(objs)
+        polydown.Scheduler().load(objs)
+        return perf_counter() - start, size
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('-n', '--count', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('-j', '--journal', type=int, default=10000, help='journal records on top')
+    args = parser.parse_args()
+
+    for count in args.count:
+        seconds, size = bench(count, min(count, args.journal))
+        print(f'{count:8} objects  {size / 1e6:6.1f} MB  restored in {seconds * 1000:7.1f} ms')
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+'''Measures how many requests per second a running polydown server
+answers when N pdc clients hammer it concurrently.
+
+By default every client repeatedly opens a connection, sends one legacy
+one-shot message and waits for the reply. With --session each client
+keeps one framed connection open and pipelines --depth requests at once.'''
+
+import argparse
+import os
+import sys
+import threading
+from time import monotonic
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import pdc
+
+def client(port, msg, deadline, counts, i):
+    done = 0
+    while monotonic() < deadline:
+        sock = pdc.connect(port)
+        sock.send(msg)
+        sock.recv(65536)
+        sock.close()
+        done += 1
+    counts[i] = done
+
+def session_client(port, msg, deadline, counts, i, depth):
+    done = 0
+    with pdc.Session(port) as session:
+        while monotonic() < deadline:
+            for request_id in [session.submit(msg.decode()) for _ in range(depth)]:
+                session.collect(request_id)
+            done += depth
+    counts[i] = done
+
+def run(port, clients, seconds, msg, depth=None):
+    counts = [0] * clients
+    deadline = monotonic() + seconds
+    target, extra = (client, ()) if depth is None else (session_client, (depth,))
+    threads = [threading.Thread(target=target, args=(port, msg, deadline, counts, i, *extra))
+               for i in range(clients)]
+    start = monotonic()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return sum(counts) / (monotonic() - start)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('-c', '--clients', type=int, nargs='+', default=[1, 4, 16, 64])
+    parser.add_argument('-t', '--time', type=float, default=3, help='seconds per run')
+    parser.add_argument('-m', '--message', default='1', help='raw message, default is "ls"')
+    parser.add_argument('-p', '--port', type=int, help='use TCP instead of the Unix socket')
+    parser.add_argument('-s', '--session', action='store_true', help='use persistent framed sessions')
+    parser.add_argument('-d', '--depth', type=int, default=16, help='pipelined requests per session')
+    args = parser.parse_args()
+
+    for n in args.clients:
+        depth = args.depth if args.session else None
+        rate = run(args.port, n, args.time, args.message.encode(), depth)
+        print(f'{n:5} clients  {rate:10.1f} req/s')
@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+'''Compares connect + round-trip latency of the Unix socket and TCP
+transports. Start the server with "polydown -p PORT" so that both are
+available.'''
+
+import argparse
+import os
+import sys
+from time import perf_counter
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import pdc
+
+def one_shot(port, msg):
+    '''Same as a "pdc" call: connect, send, wait for the reply, close'''
+    sock = pdc.connect(port)
+    sock.send(msg)
+    sock.recv(65536)
+    sock.close()
+
+def measure(port, msg, count):
+    samples = []
+    for _ in range(count):
+        start = perf_counter()
+        one_shot(port, msg)
+        samples.append(perf_counter() - start)
+    samples.sort()
+    return samples
+
+def report(name, samples):
+    us = lambda q: samples[min(len(samples) - 1, int(q * len(samples)))] * 1e6
+    mean = sum(samples) / len(samples) * 1e6
+    print(f'{name:6}  mean {mean:7.1f}us  p50 {us(0.5):7.1f}us  p99 {us(0.99):7.1f}us')
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('-n', '--count', type=int, default=5000)
+    parser.add_argument('-m', '--message', default='5 0', help='raw message, default is "cat 0"')
+    parser.add_argument('-p', '--port', type=int, default=pdc.PORT)
+    args = parser.parse_args()
+
+    msg = args.message.encode()
+    # Warm up both paths before measuring
+    measure(None, msg, 100)
+    measure(args.port, msg, 100)
+    report('unix', measure(None, msg, args.count))
+    report('tcp', measure(args.port, msg, args.count))
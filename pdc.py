@@ -1,11 +1,26 @@
 #!/usr/bin/env python3
 
 import socket
+import os
 import sys
 import re
-from datetime import datetime, timedelta, date as dt_date, time as dt_time
-
-PORT = 5000
+import stat
+import mmap
+import struct
+import itertools
+import math
+import threading
+from collections import namedtuple, deque
+from contextlib import contextmanager
+from bisect import bisect_right
+from time import sleep, time
+from calendar import isleap, monthrange
+from datetime import datetime, timedelta, MINYEAR, MAXYEAR
+
+PORT        = 5000
+TEMP_DIR    = '/tmp/polydown/'
+SOCK_FILE   = TEMP_DIR + 'polydown.sock'
+STATUS_FILE = TEMP_DIR + 'status'
 
 ACTION = {
         'add'   : 0,
@@ -17,7 +32,11 @@ ACTION = {
         'cat'   : 5,
         'cmd'   : 6,
         'stat'  : 7,
-        'kill'  : 8
+        'kill'  : 8,
+        'format': 9,
+        'subscribe': 10,
+        'batch' : 11,
+        'stats' : 12
 }
 
 OBJECT = {
@@ -27,159 +46,988 @@ OBJECT = {
         'counter'   : 3
 }
 
-def send(msg):
+# Framed sessions start with this line. Anything else is treated by the
+# server as a legacy one-shot message answered with raw text.
+MAGIC = b'PD1\n'
+
+# Reply statuses. MORE frames carry a part of the reply and are followed
+# by further frames with the same request ID, the last one being OK/ERR.
+# RETRY means that the request was not carried out because the server
+# handed over to a new one, see polydown -r, and should be sent again
+# over a new connection.
+STATUS_OK, STATUS_ERR, STATUS_MORE, STATUS_RETRY = 'OK', 'ERR', 'MORE', 'RETRY'
+
+MAX_FRAME = 64 * 1024 * 1024
+
+# Layout of the status page, a memory-mapped file the server keeps up to
+# date so that read-only queries don't have to talk to it at all.
+# The header holds the server's PID, a seqlock counter, which is odd
+# while the server is writing, and the number of records that follow.
+# Record i describes the object with index i: its type plus one (zero
+# means no object), the number of color ranges, a value, the label and
+# up to STATUS_COLORS color ranges (begin, end, fg, bg). The value is the
+# wall clock deadline of timers and alarms, the wall clock starting time
+# of stopwatches and the value of counters. A color count above
+# STATUS_COLORS marks an object whose label or colors don't fit.
+STATUS_MAGIC  = b'PDS1'
+STATUS_HEADER = struct.Struct('<4sIQI')
+STATUS_COLORS = 4
+STATUS_RECORD = struct.Struct('<BBxxd64s' + 'dd10s10s' * STATUS_COLORS)
+
+def escape(s):
+    '''Makes a string fit on a single tab-separated line'''
+    return s.replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n')
+
+def unescape(s):
+    if '\\' not in s:
+        return s
+    return re.sub(r'\\(.)', lambda m: {'t': '\t', 'n': '\n'}.get(m.group(1), m.group(1)), s)
+
+def encode_frame(*fields, payload=b''):
+    '''Encodes a frame: a header line of space-separated fields ending with
+    the payload length, followed by the payload itself'''
+    header = ' '.join(map(str, (*fields, len(payload))))
+    return header.encode() + b'\n' + payload
+
+def decode_frames(buf):
+    '''Splits all complete frames off the front of a buffer.
+    Returns a list of (fields, payload) tuples and the unconsumed rest.'''
+    frames = []
+    pos = 0
+    while True:
+        end = buf.find(b'\n', pos)
+        if end == -1:
+            if len(buf) - pos > 256:
+                raise ValueError('Frame header is too long')
+            break
+        header = buf[pos:end].decode().split()
+        if not header:
+            raise ValueError('Frame header is empty')
+        *fields, length = header
+        length = int(length)
+        if length < 0:
+            raise ValueError(f'Frame length {length} is negative')
+        if length > MAX_FRAME:
+            raise ValueError(f'Frame of {length} bytes exceeds the limit')
+        if len(buf) < end + 1 + length:
+            break
+        frames.append((fields, buf[end + 1:end + 1 + length]))
+        pos = end + 1 + length
+    return frames, buf[pos:]
+
+def check_temp_dir(create=False):
+    '''Makes sure TEMP_DIR is a directory that only the current user can
+    write to, creating it if asked. Raises PermissionError otherwise, as
+    anybody else could plant a socket or status page of their own.'''
+    if create:
+        os.makedirs(TEMP_DIR, mode=0o700, exist_ok=True)
+    st = os.lstat(TEMP_DIR.rstrip('/'))
+    if not stat.S_ISDIR(st.st_mode) or st.st_uid != os.getuid() or st.st_mode & 0o022:
+        raise PermissionError(f'{TEMP_DIR} must be a directory owned by you and writable by nobody else')
+
+def connect(port=None):
+    '''Connects to the server's Unix socket, or over TCP if a port is given'''
+    if port is None:
+        check_temp_dir()
+        sock = socket.socket(socket.AF_UNIX)
+        try:
+            sock.connect(SOCK_FILE)
+        except OSError:
+            sock.close()
+            raise
+        return sock
+    return socket.create_connection((socket.gethostname(), port))
+
+class Session:
+    '''A persistent framed connection to the server.
+
+    Any number of messages can be submit()ted without waiting for
+    replies, which are then collected with receive() and matched to
+    their requests by ID. request() does both for a single message.'''
+
+    def __init__(self, port=None):
+        self.sock = connect(port)
+        self.sock.sendall(MAGIC)
+        self.ids = itertools.count()
+        self.buf = b''
+        self.frames = []
+
+    def submit(self, msg):
+        '''Sends a message and returns its request ID'''
+        request_id = next(self.ids)
+        self.sock.sendall(encode_frame(request_id, payload=str(msg).encode()))
+        return request_id
+
+    def receive(self):
+        '''Returns the next reply frame as (request_id, status, payload)'''
+        while not self.frames:
+            data = self.sock.recv(65536)
+            if not data:
+                raise ConnectionError('Server closed the connection')
+            self.frames, self.buf = decode_frames(self.buf + data)
+            self.frames.reverse()
+        (request_id, status), payload = self.frames.pop()
+        return int(request_id), status, payload
+
+    def parts(self, request_id):
+        '''Yields the reply to the given request, which must be the oldest
+        unanswered one, as (status, text) parts as soon as they arrive'''
+        while True:
+            rid, status, payload = self.receive()
+            if rid != request_id:
+                raise ValueError(f'Expected reply to {request_id}, got {rid}')
+            yield status, payload.decode()
+            if status != STATUS_MORE:
+                return
+
+    def collect(self, request_id):
+        '''Receives a whole reply to the given request, which must be the
+        oldest unanswered one. Returns a (status, text) Reply.'''
+        parts = list(self.parts(request_id))
+        return Reply(parts[-1][0], ''.join(text for _, text in parts))
+
+    def request(self, msg):
+        return self.collect(self.submit(msg))
+
+    def batch(self, msgs):
+        '''Sends messages as a single batch, which the server applies all
+        at once. Returns a (status, text) Reply for each message.'''
+        if not msgs:
+            return []
+        status, data = self.request('{} {}'.format(ACTION['batch'], '\n'.join(map(escape, msgs))))
+        if status == STATUS_RETRY:
+            raise ConnectionError('The server is restarting, try again')
+        if status != STATUS_OK:
+            raise ValueError(data)
+        return [Reply(status, unescape(text)) for status, _, text in
+                (line.partition(' ') for line in data.split('\n'))]
+
+    def alive(self):
+        '''Whether the connection is still open, the server closes idle ones'''
+        try:
+            return self.sock.recv(1, socket.MSG_PEEK | socket.MSG_DONTWAIT) != b''
+        except BlockingIOError:
+            return True
+        except OSError:
+            return False
+
+    def close(self):
+        self.sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def subscribe(keys, port=None):
+    '''Yields a freshly formatted polybar line every time the visible
+    value of any object matching the indices/labels/ranges changes'''
+    with Session(port) as session:
+        request_id = session.submit(' '.join((str(ACTION['subscribe']), *keys)))
+        while True:
+            rid, status, payload = session.receive()
+            if status == STATUS_ERR:
+                raise ValueError(payload.decode())
+            if status != STATUS_MORE:
+                # Ended by the server, or handed over to a new one
+                return
+            yield payload.decode()
+
+# Client library: programs that talk to the server a lot use Client, or
+# AsyncClient under asyncio, instead of running pdc for every request.
+# Both keep framed sessions open and return structured results.
+
+class ServerError(Exception):
+    '''The server failed to carry out a request'''
+
+class Reply(namedtuple('Reply', 'status text')):
+    '''A whole reply to a request'''
+    __slots__ = ()
+
+    @property
+    def ok(self):
+        return self.status == STATUS_OK
+
+    def check(self):
+        '''Returns the text, raises ServerError if the request failed'''
+        if not self.ok:
+            raise ServerError(self.text)
+        return self.text
+
+ADDED_RE     = re.compile(r'Added \w+ (\d+)$')
+REMOVED_RE   = re.compile(r'Removed (\d+) object')
+NOT_FOUND_RE = re.compile(r'Object .* was not found\.')
+
+def added_index(reply):
+    match = ADDED_RE.match(reply.check())
+    if match is None:
+        raise ValueError(f'Unexpected reply: {reply.text!r}')
+    return int(match[1])
+
+def removed_count(reply):
+    match = REMOVED_RE.match(reply.check())
+    if match is None:
+        raise ValueError(f'Unexpected reply: {reply.text!r}')
+    return int(match[1])
+
+def reply_lines(reply):
+    text = reply.check()
+    if not text or NOT_FOUND_RE.match(text):
+        return []
+    return text.split('\n')
+
+def counter_values(reply):
+    '''{index: value} of the counters listed in a reply'''
+    values = {}
+    for line in reply_lines(reply):
+        index, value = line.split()
+        values[int(index)] = float(value)
+    return values
+
+def listed_objects(reply):
+    '''[(index, description)] of the objects listed by "ls"'''
+    objs = []
+    for line in reply_lines(reply):
+        index, sep, description = line.partition('  ')
+        # The last line of a limited listing tells where it left off
+        if sep and index.isdigit():
+            objs.append((int(index), description))
+    return objs
+
+class ClientBase:
+    '''Requests shared by Client and AsyncClient. They take pdc parameters
+    and return the reply in a structured form, or with AsyncClient, a
+    coroutine that does. Invalid parameters raise ValueError and failed
+    requests raise ServerError.'''
+
+    def add(self, expr, colors=()):
+        '''Adds a timer, alarm or stopwatch, e.g. "@tea 5m". colors are
+        "BEGIN:END FG:BG" ranges from parse_color_range(). Returns the
+        index of the new object.'''
+        return self.call(expr, colors, added_index)
+
+    def counter(self, expr, colors=()):
+        '''Sets or changes counters, e.g. "@hits +1" or "@a +1 @b -1".
+        Returns {index: value} of the counters it touched.'''
+        return self.call(f'c {expr}', colors, counter_values)
+
+    def cat(self, *keys):
+        '''Returns the values of matching objects as "pdc cat" shows them'''
+        return self.call(' '.join(('cat', *keys)), (), reply_lines)
+
+    def ls(self, *keys, **filters):
+        '''Returns [(index, description)] of matching objects. filters
+        are the ones "pdc ls" takes, e.g. type='timer', limit=100.'''
+        return self.call(' '.join(('ls', *keys, *(f'{k}={v}' for k, v in filters.items()))),
+                         (), listed_objects)
+
+    def rm(self, *keys):
+        '''Removes matching objects, returns how many there were'''
+        return self.call(' '.join(('rm', *keys)), (), removed_count)
+
+class Client(ClientBase):
+    '''A thread-safe client that keeps up to size sessions open and lends
+    them out to one thread at a time. Threads wait for a session when
+    all of them are busy.'''
+
+    def __init__(self, port=None, size=4):
+        self.port = port
+        self.idle = []
+        self.lock = threading.Lock()
+        self.slots = threading.BoundedSemaphore(size)
+
+    @contextmanager
+    def session(self):
+        '''Lends out a Session, reconnecting if the server has closed it'''
+        with self.slots:
+            with self.lock:
+                session = self.idle.pop() if self.idle else None
+            if session is not None and not session.alive():
+                session.close()
+                session = None
+            if session is None:
+                session = Session(self.port)
+            try:
+                yield session
+            except BaseException:
+                # Replies may still be on their way, it can't be reused
+                session.close()
+                raise
+            with self.lock:
+                self.idle.append(session)
+
+    def request(self, msg):
+        '''Sends a message as-is, returns its Reply'''
+        while True:
+            with self.session() as session:
+                reply = session.request(msg)
+                if reply.status != STATUS_RETRY:
+                    return reply
+                # The server handed over, the next session goes to the new one
+                session.close()
+
+    def pipeline(self, msgs, depth=64):
+        '''Sends messages as-is over a single session, keeping up to depth
+        of them in flight. Returns their Replies in order.'''
+        msgs = list(msgs)
+        replies, ids = [], deque()
+        with self.session() as session:
+            for msg in msgs:
+                ids.append(session.submit(msg))
+                if len(ids) >= depth:
+                    replies.append(session.collect(ids.popleft()))
+            replies.extend(session.collect(request_id) for request_id in ids)
+            if any(reply.status == STATUS_RETRY for reply in replies):
+                session.close()
+        return [self.request(msg) if reply.status == STATUS_RETRY else reply
+                for msg, reply in zip(msgs, replies)]
+
+    def run(self, line, colors=()):
+        '''Sends pdc parameters, e.g. "rm @tea", returns their Reply'''
+        return self.request(build_message(line, colors))
+
+    def call(self, line, colors, parse):
+        return parse(self.run(line, colors))
+
+    def close(self):
+        with self.lock:
+            for session in self.idle:
+                session.close()
+            self.idle = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def asyncio_module():
+    '''asyncio takes longer to import than the rest of pdc, so only the
+    async client imports it, once it is used'''
+    import asyncio
+    return asyncio
+
+class AsyncSession:
+    '''The asyncio counterpart of Session. Any number of tasks can have
+    requests in flight over it, a reader task hands every reply to the
+    one waiting for it.'''
+
+    def __init__(self, reader, writer):
+        self.reader, self.writer = reader, writer
+        self.ids = itertools.count()
+        self.waiting = {}
+        self.error = None
+        self.task = asyncio_module().get_running_loop().create_task(self.dispatch())
+
+    @classmethod
+    async def open(cls, port=None):
+        asyncio = asyncio_module()
+        if port is None:
+            check_temp_dir()
+            reader, writer = await asyncio.open_unix_connection(SOCK_FILE)
+        else:
+            reader, writer = await asyncio.open_connection(socket.gethostname(), port)
+        writer.write(MAGIC)
+        return cls(reader, writer)
+
+    @property
+    def closed(self):
+        return self.error is not None
+
+    async def dispatch(self):
+        buf = b''
+        try:
+            while True:
+                data = await self.reader.read(65536)
+                if not data:
+                    raise ConnectionError('Server closed the connection')
+                frames, buf = decode_frames(buf + data)
+                for (request_id, status), payload in frames:
+                    if status == STATUS_RETRY and self.error is None:
+                        # The server handed over, replies to what is in
+                        # flight still arrive but nothing new may be sent
+                        self.error = ConnectionError('Server handed over')
+                    future, parts = self.waiting[int(request_id)]
+                    parts.append(payload.decode())
+                    if status != STATUS_MORE:
+                        del self.waiting[int(request_id)]
+                        # Whoever was waiting may have been cancelled
+                        if not future.done():
+                            future.set_result(Reply(status, ''.join(parts)))
+        except Exception as e:
+            self.fail(e)
+            self.writer.close()
+
+    def fail(self, error):
+        '''Fails all requests in flight, the session can't be used anymore'''
+        self.error = error
+        for future, _ in self.waiting.values():
+            if not future.done():
+                future.set_exception(ConnectionError(str(error)))
+        self.waiting.clear()
+
+    async def request(self, msg):
+        '''Sends a message, returns its Reply once it has arrived'''
+        if self.error is not None:
+            raise ConnectionError(str(self.error))
+        request_id = next(self.ids)
+        future = self.task.get_loop().create_future()
+        self.waiting[request_id] = (future, [])
+        self.writer.write(encode_frame(request_id, payload=str(msg).encode()))
+        await self.writer.drain()
+        return await future
+
+    async def close(self):
+        self.task.cancel()
+        self.writer.close()
+        if self.error is None:
+            self.fail(ConnectionError('Session was closed'))
+        try:
+            await self.writer.wait_closed()
+        except OSError:
+            pass
+
+class AsyncClient(ClientBase):
+    '''The asyncio counterpart of Client. Requests of any number of tasks
+    are spread over up to size sessions, to the one with the fewest of
+    them in flight.'''
+
+    def __init__(self, port=None, size=4):
+        self.port, self.size = port, size
+        self.sessions = []
+        self.lock = asyncio_module().Lock()
+
+    async def session(self):
+        '''Picks the least busy session, opening another one while they
+        are all busy and there are fewer than size'''
+        async with self.lock:
+            self.sessions = [s for s in self.sessions if not s.closed]
+            session = min(self.sessions, key=lambda s: len(s.waiting), default=None)
+            if session is None or session.waiting and len(self.sessions) < self.size:
+                session = await AsyncSession.open(self.port)
+                self.sessions.append(session)
+            return session
+
+    async def request(self, msg):
+        '''Sends a message as-is, returns its Reply'''
+        while True:
+            reply = await (await self.session()).request(msg)
+            if reply.status != STATUS_RETRY:
+                return reply
+
+    async def pipeline(self, msgs):
+        '''Sends messages as-is, all at once, returns their Replies in
+        order. Unlike with Client, they may be carried out in any order.'''
+        return await asyncio_module().gather(*map(self.request, msgs))
+
+    async def run(self, line, colors=()):
+        '''Sends pdc parameters, e.g. "rm @tea", returns their Reply'''
+        return await self.request(build_message(line, colors))
+
+    async def call(self, line, colors, parse):
+        return parse(await self.run(line, colors))
+
+    async def close(self):
+        sessions, self.sessions = self.sessions, []
+        for session in sessions:
+            await session.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+def read_status(path=STATUS_FILE):
+    '''Reads all objects off the status page without involving the server.
+    Returns a list of (index, type, label, value, colors) tuples, or None
+    if no server is running.'''
+    try:
+        check_temp_dir()
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        # Missing, or planted by somebody else
+        return None
+    try:
+        with mmap.mmap(fd, 0, access=mmap.ACCESS_READ) as mm:
+            magic, pid, _, _ = STATUS_HEADER.unpack_from(mm)
+            if magic != STATUS_MAGIC or not pid_alive(pid):
+                return None
+            # Retry until a copy was taken while the server wasn't writing
+            while True:
+                _, _, seq, count = STATUS_HEADER.unpack_from(mm)
+                end = STATUS_HEADER.size + count * STATUS_RECORD.size
+                if seq % 2 or end > len(mm):
+                    if end > len(mm):
+                        # The page grew since it was mapped
+                        return read_status(path)
+                    if not pid_alive(pid):
+                        # It died while writing, the page stays torn
+                        return None
+                    continue
+                data = mm[STATUS_HEADER.size:end]
+                if STATUS_HEADER.unpack_from(mm)[2] == seq:
+                    break
+    except ValueError:
+        # Empty file, the server is only just starting up
+        return None
+    finally:
+        os.close(fd)
+
+    objs = []
+    for index, (kind, ncolors, value, label, *colors) in enumerate(STATUS_RECORD.iter_unpack(data)):
+        if kind == 0:
+            continue
+        if ncolors > STATUS_COLORS:
+            # Doesn't fit on the page, only the server can answer
+            return None
+        ranges = []
+        for i in range(0, 4 * ncolors, 4):
+            begin, end, fg, bg = colors[i:i + 4]
+            ranges.append((None if begin == float('-inf') else begin,
+                           None if end == float('inf') else end,
+                           fg.rstrip(b'\0').decode() or None, bg.rstrip(b'\0').decode() or None))
+        label = label.rstrip(b'\0').decode() or None
+        objs.append((index, kind - 1, label, value, ranges))
+    return objs
+
+def pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+def status_lookup(objs, keys):
+    '''Picks objects read by read_status() that match indices, BEGIN:END
+    ranges and @labels, in the same order the server would'''
+    if '*' in keys:
+        return objs
+    found = {}
+    by_index = {o[0]: o for o in objs}
+    for key in keys:
+        if key.startswith('@'):
+            found.update((o[0], o) for o in objs if o[2] == key)
+        elif ':' in key:
+            begin, _, end = key.partition(':')
+            begin = int(begin) if begin else 0
+            end = int(end) if end else float('inf')
+            found.update((o[0], o) for o in objs if begin <= o[0] <= end)
+        elif key.isdigit() and int(key) in by_index:
+            found[int(key)] = by_index[int(key)]
+    return list(found.values())
+
+def status_number(kind, value, now):
+    '''Converts a status page value into the value "pdc -f" shows'''
+    if kind in (OBJECT['timer'], OBJECT['alarm']):
+        return value - now
+    if kind == OBJECT['stopwatch']:
+        return now - value
+    return value
+
+def local_format(keys):
+    '''Same as the server's reply to "pdc -f", but read off the status
+    page. Returns None if it is unavailable.'''
+    objs = read_status()
+    if objs is None:
+        return None
+    now = time()
+    return ' '.join(format_bar(kind, label, status_number(kind, value, now), colors)
+                    for _, kind, label, value, colors in status_lookup(objs, keys))
+
+def local_cat(keys):
+    '''Same as the server's reply to "cat", but read off the status page.
+    Returns None if it is unavailable or nothing matches.'''
+    objs = read_status()
+    if not objs:
+        return None
+    now = time()
+    lines = []
+    for _, kind, label, value, colors in status_lookup(objs, keys):
+        if kind == OBJECT['alarm']:
+            lines.append(datetime.fromtimestamp(value).strftime('%Y-%m-%d %H:%M:%S'))
+        else:
+            lines.append(format_value(kind, status_number(kind, value, now)))
+    return '\n'.join(lines) or None
+
+def send(msg, port=None):
     '''Sends a string as-is to the server'''
     if msg is None:
         return False
     try:
         print(f'Sending: "{msg}"')
-        host = socket.gethostname()
-        client_socket = socket.socket()
-        client_socket.connect((host, PORT))
-        client_socket.send(str(msg).encode())
-        data = client_socket.recv(1024).decode()
-        if len(data) != 0:
-            print(re.sub(r'\\n', '\n', data))
-        client_socket.close()
-    except ConnectionRefusedError:
+        # Long listings arrive in parts, print them as they do
+        printed, retry = False, True
+        while retry:
+            retry = False
+            with Session(port) as session:
+                for status, data in session.parts(session.submit(msg)):
+                    if status == STATUS_RETRY:
+                        retry = True
+                    elif status == STATUS_ERR:
+                        print(('\n' if printed else '') + f'Error: {data}')
+                        printed = False
+                    elif data:
+                        print(re.sub(r'\\n', '\n', data), end='', flush=True)
+                        printed = True
+        if printed:
+            print()
+    except (ConnectionRefusedError, FileNotFoundError):
         print('Error: Connection to server failed')
+    except PermissionError as e:
+        print(f'Error: {e}')
     except Exception as e:
         print(f'Error: Unprecedented exception caught:\n  {type(e).__name__}')
     return True
 
-def convert(msg):
-    '''Converts raw user input into precise information for the server'''
+def read_batch(lines, colors=()):
+    '''Converts lines of pdc parameters, yielding (line number, message)
+    pairs. Lines may start with their own -c options. Blank lines and
+    lines starting with # are skipped, and so are invalid ones.'''
+    for lineno, line in enumerate(lines, 1):
+        args = line.split()
+        if not args or args[0].startswith('#'):
+            continue
+        line_colors = list(colors)
+        try:
+            while args[:1] == ['-c']:
+                line_colors.append(parse_color_range(args[1], args[2]))
+                del args[:3]
+        except (IndexError, ValueError) as e:
+            print(f'Line {lineno}: invalid -c option. {e}')
+            continue
+        try:
+            msg = build_message(' '.join(args), line_colors,
+                                warn=lambda text: print(f'Line {lineno}: {text}'))
+        except ValueError as e:
+            print(f'Line {lineno}: skipped. {e}')
+            continue
+        yield lineno, msg
+
+def send_batch(path, colors=(), port=None):
+    '''Sends every line of a file ("-" for stdin) to the server over a
+    single connection, as one batch, and prints the reply to each line'''
+    try:
+        f = sys.stdin if path == '-' else open(path)
+    except OSError as e:
+        print(f'Error: {e}')
+        return False
+    try:
+        linenos, msgs = [], []
+        for lineno, msg in read_batch(f, colors):
+            linenos.append(lineno)
+            msgs.append(msg)
+    finally:
+        if f is not sys.stdin:
+            f.close()
+    try:
+        with Session(port) as session:
+            replies = session.batch(msgs)
+    except (ConnectionError, FileNotFoundError):
+        print('Error: Connection to server failed')
+        return False
+    for lineno, (status, text) in zip(linenos, replies):
+        if status == STATUS_OK:
+            if text:
+                print(f'Line {lineno}: {text}')
+        else:
+            print(f'Line {lineno}: Error: {text}')
+    return True
 
-    # Matches natural numbers and counter names
-    REGEX = r'^([0-9]+)|(@[\w]+)$'  
+# Precompiled patterns of the client's grammar. Every token of user input
+# is matched against at most one of them per parsing step.
+COMMAND_RE   = re.compile(r'(?:^|\s)--(?:\s|$)')
+TARGET_RE    = re.compile(r'(?:[0-9]+|@\w+|[0-9]*:[0-9]*|\*)$')
+LABEL_RE     = re.compile(r'@\w+$')
+COUNTER_RE   = re.compile(r'(?:\d+|@\w+)$')
+VALUE_RE     = re.compile(r'\d+(?:\.\d+)?$')
+OPERATION_RE = re.compile(r'(//|[-+*/%^])(-?\d+(?:\.\d+)?)$')
+# Fractions need a unit, "4.5" is a date while "4.5s" is a time chunk
+CHUNK_RE     = re.compile(r'(\d+|\d+\.\d+(?=[smhd]))([smhd]?)$')
+DATE_RE      = re.compile(r'(?P<d1>\d+)\.(?P<m1>\d+)(?:\.(?P<y1>\d+))?$'
+                          r'|(?P<m2>\d+)/(?P<d2>\d+)(?:/(?P<y2>\d+))?$'
+                          r'|(?P<y3>\d+)-(?P<m3>\d+)(?:-(?P<d3>\d+))?$')
+TIME_RE      = re.compile(r'(?P<hour>\d+)(?::(?P<minute>\d+)(?::(?P<second>\d+))?)?(?P<pm_am>PM|AM)?$')
+
+UNIT = {'': 1, 's': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+# Keywords that make a timer or alarm recur, and seconds between repeats.
+# "every" repeats as often as the time chunks that follow it say.
+REPEAT = {'every': None, 'daily': 86400, 'weekly': 7 * 86400}
+
+def convert(msg, colors=()):
+    '''Converts raw user input into precise information for the server.
+    Prints what is wrong with it and returns None if it is invalid.'''
+    try:
+        return build_message(msg, colors, warn=print)
+    except ValueError as e:
+        print(f'Error: {e}')
+        return None
 
-    # Aliases for cleaner code 
-    A = ACTION 
-    ERR_PID_NAME   = '\'{}\' is neither a PID nor a counter name, aborting...'
-    ERR_INDEX_NAME = '\'{}\' is neither an index nor a counter name, aborting...'
+def build_message(msg, colors=(), warn=None):
+    '''Same as convert(), but raises ValueError for invalid input. Parts
+    that are ignored are reported to warn(), if given.'''
 
-    # Split arguments
-    msg = msg.split()
+    # Aliases for cleaner code
+    A = ACTION
+    warn = warn or (lambda text: None)
+    ERR_PID_NAME   = '\'{}\' is neither a PID nor a counter name'
+    ERR_INDEX_NAME = '\'{}\' is neither an index nor a counter name'
 
-    # If no action specified, infer add
-    if msg[0] not in A:
-        msg.insert(0, 'add')
+    # Split off the command to run once a timer or alarm expires
+    command = None
+    if '--' in msg:
+        msg, *command = COMMAND_RE.split(msg, maxsplit=1)
+        command = command[0].strip() if command else None
+
+    # Split arguments, if no action specified, infer add
+    msg = msg.split()
+    if msg and msg[0] in A:
+        action = A[msg.pop(0)]
+    else:
+        action = A['add']
 
     # Process specific actions
-    action = A[msg[0]]
-    if action in (A['ls'], A['kill']):
-        if len(msg) > 1:
-            print(f'\'{msg[0]}\' does not take parameters, ignoring...')
-        ret = str(action)
-    elif action in (A['rm'], A['pidof'], A['index'], A['cmd'], A['cat'], A['stat']):
-        for i in msg[1:]:
-            if not re.match(REGEX, i):
-                print(ERR_INDEX_NAME.format(i) if action != A['index'] else ERR_PID_NAME.format(i))
-                ret = None
-        ret = ' '.join((str(action), *msg[1:]))
-    elif action == A['add']:
-        ERR_MSG = 'Failed to parse parameters, aborting...'
-
-        # Cache these values
-        msg = msg[1:]
-        string = ' '.join(msg)
-
-        # These will hold final data that will be passed to the send() function
-        obj, arg = None, None
-
-        # Timer
-        if all(is_time_chunk(i) for i in msg):
-            obj = OBJECT['timer']
-            arg = str(sum(list(time_chunk_to_sec(i) for i in msg)))
-
-        # Alarm (time chunk format)
-        elif string[0] == '+':
-            obj = OBJECT['alarm']
-            # Trim the + sign to leave out only time chunks
-            if msg[0] == '+':
-                del msg[0]
-            else:
-                msg[0] = msg[0][1:]
-            if any(not is_time_chunk(i) for i in msg):
-                print('Error: Invalid alarm parameters')
-                ret = None
-            else:
-                arg = str(sum(list(time_chunk_to_sec(i) for i in msg)))
-
-        # Stopwatch
-        elif msg[0] == 's':
-            obj = OBJECT['stopwatch']
-            del msg[0]
-            if any(not is_time_chunk(i) for i in msg):
-                print('Error: Invalid stopwatch parameters')
-                ret = None
+    if action in (A['kill'], A['stats']):
+        if msg:
+            warn(f'\'{[k for k, v in A.items() if v == action][0]}\' does not take parameters, ignoring...')
+        return str(action)
+    elif action in (A['ls'], A['stat']):
+        args = [str(action)]
+        for i in msg:
+            name, sep, value = i.partition('=')
+            if not sep and TARGET_RE.match(i) is not None:
+                args.append(i)
+            elif name == 'type' and value in OBJECT:
+                args.append(i)
+            elif name == 'within' and is_time_chunk(value):
+                args.append(f'within={time_chunk_to_sec(value)}')
+            elif name in ('limit', 'after') and value.isdigit():
+                args.append(i)
             else:
-                arg = str(sum(list(time_chunk_to_sec(i) for i in msg)))
-
-        # Counter
-        elif msg[0] == 'c':
-            obj = OBJECT['counter']
-            if len(msg) < 2:
-                print('Error: Not enough arguments for counter')
-                ret = None
-            elif re.match(r'^(\d+|@\w+)$', msg[1]) is None:
-                print('Error: invalid counter index/name')
-                ret = None
-            else:
-                del msg[0]
-                # If only name is passed, value becomes 0 by default
-                if len(msg) == 1:
-                    arg = f'{msg[0]} 0'
-                # If value was passed without an operand (set value)
-                elif len(msg) == 2 and re.match(r'^\d+(\.\d+)?$', msg[1]):
-                    arg = f'{msg[0]} {msg[1]}'
-                # if operator was passed with a space before the operand (e.g. + 5)
-                elif len(msg) == 3 and msg[1] in ('+', '-', '*', '/', '%', '^') and re.match(r'^\d+(\.\d+)?$', msg[2]):
-                    # modulo is only allowed with integers
-                    if msg[1] == '%' and '.' in msg[2]:
-                        print('Error: operation modulo (%) is only allowed with integer parameters!')
-                        ret = None
-                    arg = ' '.join(msg)
-                # if operator and operand were passed as one parameter (e.g. +5)
-                elif len(msg) == 2 and msg[1][0] in ('+', '-', '*', '/', '%', '^') and re.match(r'^\d+(\.\d+)?$', msg[1][1:]):
-                    arg = ' '.join((msg[0], msg[1][0], msg[1][1:]))
-
-        # Alarm again (datetime format)
+                raise ValueError(f'\'{i}\' is neither an index, a label nor a valid filter')
+        return ' '.join(args)
+    elif action != A['add']:
+        for i in msg:
+            if TARGET_RE.match(i) is None:
+                raise ValueError(ERR_INDEX_NAME.format(i) if action != A['index'] else ERR_PID_NAME.format(i))
+        return ' '.join((str(action), *msg))
+
+    obj, label, arg, repeat = parse_add(msg)
+    ret = f'{action} {obj} '
+    for r in colors:
+        ret += f'-c {r} '
+    if repeat is not None:
+        ret += f'-r {repeat} '
+    if label is not None:
+        ret += f'{label} '
+    ret += arg
+    if command:
+        if obj == OBJECT['counter']:
+            warn('Counters do not run commands, ignoring...')
         else:
-            dt = extract_datetime(string)
-            if dt is not None:
-                obj = OBJECT['alarm']
-                arg = '{}-{}-{} {}:{}:{}'.format(dt.year, dt.month, dt.day, dt.hour, dt.minute, dt.second)
-            else:
-                print('Error: Invalid syntax')
-                ret = None
-
-        if action is None or obj is None or arg is None:
-            ret = None
-        else:
-            ret = ' '.join(tuple(map(str, (action, obj, arg))))
+            ret += f' -- {command}'
     return ret
 
+def parse_add(msg):
+    '''Classifies the tokens of an "add" expression.
+    Returns (object type, label, argument for the server, seconds between
+    repeats or None), raises ValueError if they make no sense.'''
+
+    # Optional label preceding the expression
+    label = None
+    if len(msg) > 1 and LABEL_RE.match(msg[0]):
+        label, msg = msg[0], msg[1:]
+    first = msg[0] if msg else ''
+
+    # Recurring timer or alarm
+    if first in REPEAT:
+        obj, inner, arg, _ = parse_add(msg[1:])
+        label = inner if label is None else label
+        repeat = REPEAT[first]
+        if repeat is None:
+            # Timers and "+" alarms repeat as often as they are set to
+            if obj not in (OBJECT['timer'], OBJECT['alarm']) or ' ' in arg:
+                raise ValueError('"every" needs time chunks, see "pdc --help"')
+            repeat = float(arg)
+        elif obj != OBJECT['alarm'] or ' ' not in arg:
+            raise ValueError(f'"{first}" needs a date and/or time, see "pdc --help"')
+        if repeat < 1:
+            raise ValueError('Objects can repeat at most once a second')
+        return obj, label, arg, repeat
+
+    # Timer
+    total = sum_chunks(msg)
+    if total is not None:
+        return OBJECT['timer'], label, str(total), None
+
+    # Alarm (time chunk format)
+    if first[:1] == '+':
+        # Trim the + sign to leave out only time chunks
+        total = sum_chunks(msg[1:] if first == '+' else [first[1:], *msg[1:]])
+        if total is None:
+            raise ValueError('Invalid alarm parameters')
+        return OBJECT['alarm'], label, str(total), None
+
+    # Stopwatch
+    if first == 's':
+        total = sum_chunks(msg[1:])
+        if total is None:
+            raise ValueError('Invalid stopwatch parameters')
+        return OBJECT['stopwatch'], label, str(total), None
+
+    # Counter
+    if first == 'c':
+        return OBJECT['counter'], None, parse_counter(msg[1:]), None
+
+    # Alarm again (datetime format)
+    dt = extract_datetime(' '.join(msg))
+    return OBJECT['alarm'], label, '{}-{}-{} {}:{}:{}'.format(
+            dt.year, dt.month, dt.day, dt.hour, dt.minute, dt.second), None
+
+def parse_counter(args):
+    '''Parses "<TARGET> [OPERATOR] [VALUE]"..., returns the server argument.
+    Raises ValueError if it is invalid.'''
+    if not args:
+        raise ValueError('Not enough arguments for counter')
+    ops = []
+    i = 0
+    while i < len(args):
+        target = args[i]
+        if COUNTER_RE.match(target) is None:
+            raise ValueError(f'invalid counter index/name \'{target}\'')
+        rest = args[i + 1:i + 3]
+        # If value was passed without an operand (set value)
+        if rest[:1] and VALUE_RE.match(rest[0]):
+            ops.append(f'{target} {rest[0]}')
+            i += 2
+            continue
+        # Operator and operand, with or without a space between them
+        match = None
+        for n in (1, 2):
+            if len(rest) >= n:
+                match = OPERATION_RE.match(''.join(rest[:n]))
+                if match is not None:
+                    break
+        if match is None:
+            # If only name is passed, value becomes 0 by default
+            if not rest or COUNTER_RE.match(rest[0]):
+                ops.append(f'{target} 0')
+                i += 1
+                continue
+            raise ValueError('Invalid counter parameters')
+        operator, value = match.groups()
+        # modulo is only allowed with integers
+        if operator == '%' and '.' in value:
+            raise ValueError('operation modulo (%) is only allowed with integer parameters!')
+        ops.append(f'{target} {operator} {value}')
+        i += 1 + n
+    return ' '.join(ops)
+
+def sum_chunks(chunks):
+    '''Sums up time chunks in seconds, None if any of them is invalid'''
+    total = 0.0
+    match = CHUNK_RE.match
+    for chunk in chunks:
+        m = match(chunk)
+        if m is None:
+            return None
+        total += float(m[1]) * UNIT[m[2]]
+    return total
+
 def is_time_chunk(s):
     '''A "time chunk" is a string in this format: 5s, 3d, 0.3s...'''
-    return re.match(r'^[\d]+(\.\d+[smhd]|[smhd]?)$', s) is not None
+    return CHUNK_RE.match(s) is not None
 
 def time_chunk_to_sec(s):
-    if s[-1] not in ('s', 'm', 'h', 'd') and '.' not in s:
-        return float(s)
-    if s[-1] == 's':
-        return float(s[:-1])
-    if s[-1] == 'm':
-        return 60 * float(s[:-1])
-    if s[-1] == 'h':
-        return 3600 * float(s[:-1])
-    if s[-1] == 'd':
-        return 86400 * float(s[:-1])
-    raise ValueError(f'\'{s}\' is not a time chunk!')
+    m = CHUNK_RE.match(s)
+    if m is None:
+        raise ValueError(f'\'{s}\' is not a time chunk!')
+    return float(m[1]) * UNIT[m[2]]
+
+def format_seconds(sec):
+    '''Formats an amount of seconds as [D-]HH:MM:SS'''
+    sec = max(0, int(sec))
+    days, sec = divmod(sec, 86400)
+    hours, sec = divmod(sec, 3600)
+    minutes, sec = divmod(sec, 60)
+    if days:
+        return f'{days}-{hours:02}:{minutes:02}:{sec:02}'
+    return f'{hours:02}:{minutes:02}:{sec:02}'
+
+def format_number(value):
+    '''Formats a counter value, display precision is 0.001'''
+    return '{:.3f}'.format(value).rstrip('0').rstrip('.')
+
+def format_value(kind, value):
+    '''Formats remaining or elapsed seconds, or a counter value'''
+    return format_number(value) if kind == OBJECT['counter'] else format_seconds(value)
+
+def format_bar(kind, label, value, colors, table=None):
+    '''Formats one object the way "pdc -f" prints it. value is the
+    remaining or elapsed time in seconds, or the counter value, and it
+    is what -c color ranges are matched against. table is the ranges
+    precompiled by color_table(), if at hand.'''
+    text = format_value(kind, value)
+    if label is not None:
+        text = '{} {}'.format(label[1:], text)
+    color = match_color(color_table(colors) if table is None else table, value)[0]
+    return text if color is None else polybar_format(text, *color)
+
+def color_table(colors):
+    '''Precompiles -c color ranges, of which the first matching one wins,
+    into sorted boundaries and the (fg, bg) that applies from each of
+    them up to the next one, None where no range matches'''
+    points = set()
+    for begin, end, _, _ in colors:
+        if begin is not None:
+            points.add(begin)
+        if end is not None:
+            # Ends are inclusive, the next interval starts right after
+            points.add(math.nextafter(end, math.inf))
+    points = sorted(points)
+    entries = []
+    for start in [-math.inf] + points:
+        entries.append(next(((fg, bg) for begin, end, fg, bg in colors
+                             if (begin is None or start >= begin) and (end is None or start <= end)), None))
+    return points, entries
+
+def match_color(table, value):
+    '''Looks value up in a color_table(). Returns its (fg, bg), or None,
+    and the bounds [lo, hi) of the interval the result holds in.'''
+    points, entries = table
+    i = bisect_right(points, value)
+    return (entries[i], points[i - 1] if i else -math.inf,
+            points[i] if i < len(points) else math.inf)
+
+def parse_color_range(bounds, colors):
+    '''Validates the parameters of a "-c BEGIN:END FG:BG" option and
+    returns them as a single space-free "BEGIN:END FG:BG" token pair'''
+    begin, sep1, end = bounds.partition(':')
+    fg, sep2, bg = colors.partition(':')
+    if not sep1 or not sep2:
+        raise ValueError('Color ranges need both colons, e.g. "-c 0:60 #f00:"')
+    begin, end = (str(time_chunk_to_sec(i) if is_time_chunk(i) else float(i)) if i else ''
+                  for i in (begin, end))
+    for color in (fg, bg):
+        if color and re.match(r'^#[0-9a-fA-F]{3,8}$', color) is None:
+            raise ValueError(f'\'{color}\' is not a hex color')
+    return f'{begin}:{end} {fg}:{bg}'
+
+def polybar_format(text, fg=None, bg=None):
+    '''Wraps text in polybar color tags'''
+    if fg:
+        text = f'%{{F{fg}}}{text}%{{F-}}'
+    if bg:
+        text = f'%{{B{bg}}}{text}%{{B-}}'
+    return text
 
 def extract_datetime(s):
-    '''Converts a datetime string into a datetime object'''
-    now = datetime.now()
+    '''Converts a datetime string into a datetime object, raises
+    ValueError if it is invalid'''
     args = s.upper().split()
 
     if len(args) == 1:
@@ -196,24 +1044,13 @@ def extract_datetime(s):
     elif len(args) == 2:
         date, time = args
     else:
-        print('Too many arguments. See "pdc --help" for reference.')
-        return None
+        raise ValueError('Too many arguments. See "pdc --help" for reference.')
 
-    day,  month,  year   = (None,) * 3
-    hour, minute, second = (None,) * 3
+    day, month, year = 1, None, None
+    hour, minute, second = 0, 0, 0
     pm_am = None
 
     if date is not None:
-
-        # Extract date
-        match = re.match(r'^(?P<day>\d+)\.(?P<month>\d+)(\.(?P<year>\d+))?$', date)
-        if match is None:
-            match = re.match(r'^(?P<month>\d+)/(?P<day>\d+)(/(?P<year>\d+))?$', date)
-            if match is None:
-                match = re.match(r'^(?P<year>\d+)-(?P<month>\d+)(-(?P<day>\d+))?$', date)
-                if match is None:
-                    print('Unrecognized date format. Available: "dd.mm.yyyy", "mm/dd/yyyy", "yyyy-mm-dd"')
-                    return None
         # Notice that in the first two formats year can be omitted,
         # while in the third format the day can be omitted.
         # If a day is omitted, we simply assume it to be 1.
@@ -223,52 +1060,35 @@ def extract_datetime(s):
         # in November, the year is assumed to be the current one,
         # but if the requested a date in March, the year would have to be
         # the subsequent one. The check will be performed later.
-
-        # Store matches
-        day   = match.group('day'  )
-        month = match.group('month')
-        year  = match.group('year' ) 
- 
-        # Convert known values
-        day   = int(day if day is not None else 1)
-        month = int(month)
+        match = DATE_RE.match(date)
+        if match is None:
+            raise ValueError('Unrecognized date format. Available: "dd.mm.yyyy", "mm/dd/yyyy", "yyyy-mm-dd"')
+        day   = int(match['d1'] or match['d2'] or match['d3'] or 1)
+        month = int(match['m1'] or match['m2'] or match['m3'])
+        year  = match['y1'] or match['y2'] or match['y3']
         year  = int(year) if year is not None else None
 
     # If date is omitted completely and there's only time,
     # then depending on the current time the date will either be
     # today or tomorrow. This check is also performed later.
-    
+
     if time is not None:
-        # Extract time
-        # Some match strings contain unmatchable groups, e.g. '...$(?P<unmatchable>_)?'
-        # This is a hacky way to enforce that these named groups always exist in the match object,
-        # to avoid ugly checks later on. Basically, everything that doesn't exist always has None value.
-        match = re.match(r'^(?P<hour>\d+):(?P<minute>\d+)(:(?P<second>\d+))?$(?P<pm_am>_)?', time)
+        # 24-hour time needs a colon unless it follows a date,
+        # see the comment above
+        match = TIME_RE.match(time)
         if match is None:
-            match = re.match(r'^(?P<hour>\d+)(:(?P<minute>\d+)(:(?P<second>\d+))?)?(?P<pm_am>PM|AM)', time)
-            if match is None and date is not None:
-                match = re.match(r'^(?P<hour>\d+)$(?P<minute>_)?(?P<second>_)?(?P<pm_am>_)?', time)
-                if match is None:
-                    print('Unrecognized time format. See "pdc --help" for valid examples.')
-                    return None
-
-        # Store matches
-        hour   = match.group('hour'  )
-        minute = match.group('minute')
-        second = match.group('second')
-        pm_am  = match.group('pm_am' )
-
-    # Convert to int and if any time values were omitted, assume 0
-    hour   = int(hour   if hour   is not None else 0)
-    minute = int(minute if minute is not None else 0)
-    second = int(second if second is not None else 0)
+            raise ValueError('Unrecognized time format. See "pdc --help" for valid examples.')
+        hour   = int(match['hour'])
+        minute = int(match['minute'] or 0)
+        second = int(match['second'] or 0)
+        pm_am  = match['pm_am']
 
     # Verify time validity
-    try:
-        dt = dt_time(hour, minute, second)
-    except Exception as e:
-        print(f'{type(e).__name__}: {e}')
-        return None
+    if pm_am is not None and not 1 <= hour <= 12:
+        raise ValueError('hour must be in 1..12 for pm/am times')
+    for name, value, limit in (('hour', hour, 23), ('minute', minute, 59), ('second', second, 59)):
+        if not 0 <= value <= limit:
+            raise ValueError(f'{name} must be in 0..{limit}')
 
     # Convert 12-hour time to 24-hour time
     if pm_am is not None:
@@ -276,49 +1096,91 @@ def extract_datetime(s):
             hour = 0
         elif hour != 12 and pm_am == 'PM':
             hour += 12
-    
+
+    now = datetime.now()
+
     # If date was omitted, find the closest suitable one
     if date is None:
-        d = datetime(now.year, now.month, now.day, hour, minute, second)
-        if d < now:
-            d += timedelta(1)
-        day   = d.day
-        month = d.month
-        year  = d.year
+        dt = datetime(now.year, now.month, now.day, hour, minute, second)
+        return dt + timedelta(1) if dt < now else dt
+
+    # Verify date validity
+    if not 1 <= month <= 12:
+        raise ValueError('month must be in 1..12')
+    if year is not None and not MINYEAR <= year <= MAXYEAR:
+        raise ValueError(f'year {year} is out of range')
+    # Without a year, use 2016, because it was a leap year (Feb 29 is valid)
+    if not 1 <= day <= monthrange(2016 if year is None else year, month)[1]:
+        raise ValueError('day is out of range for month')
 
     # If year was omitted, find the closest suitable one
-    elif year is None:
-        # Verify month and day validity
-        # Use 2016 as year, because it was a leap year (Feb 29 is a valid date)
-        try:
-            dt = dt_date(2016, month, day)
-        except Exception as e:
-            print(f'{type(e).__name__}: {e}')
-            return None
-
-        # Increment year till the date is valid and in the future
+    if year is None:
         year = now.year
-        dt = datetime(year, month, day, hour, minute, second)
-        while dt < now:
+        if (month, day, hour, minute, second, 0) < (now.month, now.day, now.hour,
+                                                    now.minute, now.second, now.microsecond):
+            year += 1
+        # Feb 29 only comes around in leap years
+        while month == 2 and day == 29 and not isleap(year):
             year += 1
-            try:
-                dt = datetime(year, month, day, hour, minute, second)
-            except ValueError:
-                continue
 
-    # Verify full timedate validity
-    try:
-        dt = datetime(year, month, day, hour, minute, second)
-    except Exception as e:
-        print(f'{type(e).__name__}: {e}')
-        return None
-    
-    return dt
+    return datetime(year, month, day, hour, minute, second)
 
 if __name__ == '__main__':
-    if len(sys.argv) == 1:
-        send(ACTION['list'])
-    elif sys.argv[1] in ('--help', '-h'):
+    args = sys.argv[1:]
+    port, colors, tail = None, [], False
+    while args and args[0] in ('-p', '--port', '-c', '-t', '--tail'):
+        option = args.pop(0)
+        try:
+            if option in ('-p', '--port'):
+                port = int(args.pop(0))
+            elif option == '-c':
+                colors.append(parse_color_range(args.pop(0), args.pop(0)))
+            else:
+                tail = True
+        except (IndexError, ValueError) as e:
+            print(f'Error: invalid {option} option. {e}')
+            sys.exit(1)
+
+    if len(args) == 0:
+        send(ACTION['list'], port)
+    elif args[0] in ('-f', '--format'):
+        # Print nothing but the formatted line, it goes straight to polybar
+        keys = args[1:] or [':']
+        for key in keys:
+            if TARGET_RE.match(key) is None:
+                print(f'Error: \'{key}\' is neither an index, a range nor a label')
+                sys.exit(1)
+        while tail:
+            try:
+                for line in subscribe(keys, port):
+                    print(line, flush=True)
+                # The server ended the subscription, most likely because
+                # it handed over to a new one, resubscribe right away
+                continue
+            except (ConnectionError, FileNotFoundError):
+                pass
+            except (PermissionError, ValueError) as e:
+                print(f'Error: {e}')
+                sys.exit(1)
+            # Blank the module while the server is unreachable
+            print('', flush=True)
+            sleep(1)
+        # Prefer the status page, which costs the server nothing
+        line = local_format(keys) if port is None else None
+        if line is not None:
+            print(line)
+            sys.exit(0)
+        try:
+            with Session(port) as session:
+                print(session.request(' '.join((str(ACTION['format']), *keys)))[1])
+        except (ConnectionError, FileNotFoundError):
+            print('')
+    elif args[0] in ('-i', '--input'):
+        if len(args) != 2:
+            print('Error: -i takes exactly one FILE, use "-" for stdin')
+            sys.exit(1)
+        send_batch(args[1], colors, port)
+    elif args[0] in ('--help', '-h'):
         print('''PDC(1)
 
 NAME
@@ -336,13 +1198,19 @@ DESCRIPTION
 
 OPTIONS
         -p <PORT>, --port <PORT>
-        The port the server is listening on, default is 5000.
+        Connect over TCP to the given port instead of the server's
+        Unix socket (/tmp/polydown/polydown.sock). The server has to
+        be started with the same option, e.g. "polydown -p 5000".
 
         -h, --help
         Print this help page.
 
         -i <FILE>, --input <FILE>
         Run pdc for every line in file, using each line as parameters.
+        Use "-" to read from stdin. Each line may begin with its own -c
+        options, blank lines and lines starting with # are ignored.
+        All lines are sent over a single connection and applied by the
+        server at once, then the reply to each line is printed.
 
         -c <BEGIN:END> <FG:BG>
         When object's value within the given range, set its foreground
@@ -351,6 +1219,9 @@ OPTIONS
         either BEGIN, END or both to specify a limitless range.
         You can omit FG or BG to reset that color to polybar default.
         Don't forget the colons, even if omitting some values.
+        For timers, alarms and stopwatches the value is in seconds
+        (time chunks such as 5m work too), for counters it is the
+        counter's value. The first matching range wins.
 
         -f <INDEX>... [BEGIN:END], --format <INDEX>... [BEGIN:END]
         Print a polybar-formatted string including all objects whose
@@ -358,10 +1229,20 @@ OPTIONS
         each object that was created with the -c option.
         You may use a colon range to specify a range of indices
         (same rules as in -c, e.g. use a single colon to list all).
+        Labels (@LABEL) may be listed as well.
         If this option is used, no ACTION can follow, every subsequent
         parameter is interpreted as an object index.
         This is the intended option to use in a Polybar config
-        as custom/script type.
+        as custom/script type. The output is read directly off the
+        server's status page in /tmp/polydown/ (as is the output of
+        "cat"), the server itself is not contacted.
+
+        -t, --tail
+        Used together with -f. Instead of printing once and exiting,
+        stay connected and print a new line whenever the formatted
+        output changes. Use it with "tail = true" in the Polybar
+        module instead of an interval, e.g.
+            exec = pdc -t -f 0:3
 
 ACTIONS
         add [@LABEL] <EXPRESSION>
@@ -382,9 +1263,17 @@ ACTIONS
             any number of space-separated indices/labels. To destroy
             all objects at once, you may use a single asterisk (*).
 
-        ls, list
-            Lists all existing time objects with basic information.
+        ls, list [INDEX]... [@LABEL]... [FILTER]...
+            Lists time objects with basic information, all of them
+            unless indices/labels are given.
             Calling "pdc" with no arguments defaults to this action.
+            Filters narrow the list down and page through it:
+                type=TYPE     only timers, alarms, stopwatches or counters
+                within=CHUNK  only objects due within that time, e.g. 5m
+                limit=COUNT   at most COUNT objects
+                after=INDEX   only objects with higher indices, use it to
+                              continue where a limited listing ended
+            Objects are listed in index order and printed as they arrive.
 
         pidof [INDEX]... [@LABEL]...
             Prints PIDs of all objects matching the indices/labels.
@@ -404,15 +1293,24 @@ ACTIONS
                 * stopwatches: elapsed time
                 * counters:    current value
 
-        stat [INDEX]... [@LABEL]...
+        stat [INDEX]... [@LABEL]... [FILTER]...
             Prints every known information about all objects matching
-            the indices/labels. The information respectively includes:
+            the indices/labels, and the same filters as ls, all objects
+            if none are given. The information respectively includes:
                 * always:      type, index, PID, label
                 * timers:      starting and remaining time, command
                 * alarms:      alarm datetime, remaining time, command
                 * stopwatches: starting and elapsed time
                 * counters:    stored value
             
+        stats
+            Prints the server's own metrics: request counts and latency
+            histograms per action, live objects by type, connections,
+            expiry commands, scheduler lag (how late objects expired)
+            and journal flush times. Start the server with
+            "--stats-interval SECONDS" to also have them written to
+            /tmp/polydown/stats periodically.
+
         kill
             Kills the Polydown server. This is exactly the same as calling
             "polydown -k" or "polydown --kill". All existing time objects
@@ -480,11 +1378,15 @@ TIME OBJECTS SYNTAX
 ------- COUNTER - stores a number and lets you transform it at will
 
         Syntax:
-            pdc c <TARGET> [OPERATOR] [VALUE]
+            pdc c <TARGET> [OPERATOR] [VALUE] [<TARGET> [OPERATOR] [VALUE]]...
             TARGET must be either INDEX or @LABEL (note the prefix).
             OPERATOR must be one of: +, -, *, /, //, ^, %
             VALUE must be a real number, display precision is 0.001.
 
+            Several operations may be given at once, they are applied
+            in order and atomically: if any of them fails (e.g. division
+            by zero), no counter is changed.
+
             When specifying TARGET by index, if the index does not
             belong to a counter object, you will receive a warning.
 
@@ -494,6 +1396,33 @@ TIME OBJECTS SYNTAX
             pdc c 4 ^-0.12  - raise index 4 to the -0.12th power
             pdc c 1 %4      - set index 1 to its value mod 4
             pdc c @abc 0    - set counters with "abc" label to 0
+            pdc c @a +1 @b -1 - move one from counter "b" to "a"
+
+------- RECURRING - timers and alarms that start over when they hit 0
+
+        Syntax:
+         1) pdc every [CHUNK]... [-- COMMAND]
+            pdc every +[CHUNK]... [-- COMMAND]
+            A timer or alarm (note the "+") that is set again to the
+            same amount of time every time it hits 0.
+
+         2) pdc daily [DATETIME] [-- COMMAND]
+            pdc weekly [DATETIME] [-- COMMAND]
+            An alarm that rings at DATETIME, which is written as for any
+            alarm, and again at the same time of day every day or week.
+
+            The COMMAND runs on every repeat. The object keeps its index
+            and label until you remove it. Repeats have to be at least
+            one second apart. Alarm repeats that go by while the server
+            is down are skipped by default; start the server with
+            "--missed once" to run the command once for all of them, or
+            "--missed all" to run it for every one.
+
+        Examples:
+            pdc @tea every 25m -- notify-send Tea - every 25 minutes
+            pdc daily 8:00 -- backup.sh          - every day at 8am
+            pdc weekly 1.6 9am                   - Jun 1st at 9am, then
+                                                   on that weekday
 
 
 IMPORTANT NOTES
@@ -541,4 +1470,10 @@ Source code: https://github.com/Randoragon/polydown
 
 Copyright (C) 2020 Randoragon. Distributed under the MIT License.''')
     else:
-        send(convert(sys.argv[1:]))
+        msg = convert(' '.join(args), colors)
+        if msg is not None and msg.startswith(f'{ACTION["cat"]} ') and port is None:
+            reply = local_cat(msg.split()[1:])
+            if reply is not None:
+                print(reply)
+                sys.exit(0)
+        send(msg, port)
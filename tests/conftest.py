@@ -0,0 +1,91 @@
+import os
+import subprocess
+import sys
+from importlib.machinery import SourceFileLoader
+from importlib.util import module_from_spec, spec_from_loader
+from time import monotonic, sleep
+
+import pytest
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+import pdc
+
+@pytest.fixture(scope='session')
+def polydown():
+    '''The server script loaded as a module, for its classes'''
+    loader = SourceFileLoader('polydown', os.path.join(ROOT, 'polydown'))
+    module = module_from_spec(spec_from_loader('polydown', loader))
+    loader.exec_module(module)
+    return module
+
+def wait_for(predicate, timeout=10):
+    deadline = monotonic() + timeout
+    while monotonic() < deadline:
+        if predicate():
+            return True
+        sleep(0.05)
+    return False
+
+def reachable():
+    try:
+        pdc.connect().close()
+        return True
+    except OSError:
+        return False
+
+class Server:
+    '''A private polydown server process with HOME in a temporary
+    directory. Its socket lives in /tmp/polydown like any other's.'''
+
+    def __init__(self, home, *args):
+        self.home = home
+        self.log = open(os.path.join(home, 'server.log'), 'w')
+        self.proc = subprocess.Popen([sys.executable, os.path.join(ROOT, 'polydown'), *args],
+                                     env=dict(os.environ, HOME=home),
+                                     stdout=self.log, stderr=subprocess.STDOUT)
+
+    def connect(self):
+        sock = pdc.connect()
+        sock.settimeout(5)
+        return sock
+
+    def send(self, data):
+        '''Sends raw bytes on a fresh connection, returns all it gets back
+        until the server hangs up'''
+        sock = self.connect()
+        with sock:
+            sock.sendall(data)
+            reply = b''
+            while True:
+                part = sock.recv(65536)
+                if not part:
+                    return reply
+                reply += part
+
+    def alive(self):
+        return self.proc.poll() is None
+
+    def stop(self):
+        if self.alive():
+            try:
+                self.send(b'kill')
+            except OSError:
+                pass
+            try:
+                self.proc.wait(10)
+            except subprocess.TimeoutExpired:
+                self.proc.kill()
+                self.proc.wait()
+        self.log.close()
+
+@pytest.fixture
+def server(tmp_path):
+    if reachable():
+        pytest.skip('Another polydown server is running')
+    srv = Server(str(tmp_path))
+    if not wait_for(lambda: reachable() or not srv.alive()) or not srv.alive():
+        srv.stop()
+        pytest.fail('The server did not come up')
+    yield srv
+    srv.stop()
@@ -0,0 +1,9 @@
+import pdc
+
+def test_null_byte_in_command(server):
+    with pdc.Session() as session:
+        status, _ = session.request('0 0 @n 0.1 -- echo a\0b')
+        assert status == pdc.STATUS_ERR
+        assert session.request('0 0 @n 0.1 -- true')[0] == pdc.STATUS_OK
+        assert session.request('1')[0] == pdc.STATUS_OK
+    assert server.alive()
@@ -0,0 +1,51 @@
+import pytest
+
+import pdc
+
+def test_decode_frames():
+    buf = pdc.encode_frame(1, payload=b'abc') + pdc.encode_frame(2, 'OK') + b'3 5\nab'
+    frames, rest = pdc.decode_frames(buf)
+    assert frames == [(['1'], b'abc'), (['2', 'OK'], b'')]
+    assert rest == b'3 5\nab'
+
+def test_decode_frames_incomplete_header():
+    assert pdc.decode_frames(b'1 3') == ([], b'1 3')
+
+@pytest.mark.parametrize('buf', [
+    b'0 -5\nabc',                      # negative length
+    b'\nabc',                          # empty header
+    b'0 x\nabc',                       # length is no number
+    b'0 ' + str(pdc.MAX_FRAME + 1).encode() + b'\n',
+    b'0' * 300,                        # header that never ends
+])
+def test_decode_frames_invalid(buf):
+    with pytest.raises(ValueError):
+        pdc.decode_frames(buf)
+
+def test_framed_and_legacy_clients(server):
+    with pdc.Session() as session:
+        assert session.request('0 0 @f 60')[0] == pdc.STATUS_OK
+        # A legacy client in between sees the same objects
+        assert b'@f' in server.send(b'1')
+        first, second = session.submit('5 @f'), session.submit('5 @g')
+        assert session.collect(first)[0] == pdc.STATUS_OK
+        assert 'not found' in session.collect(second)[1]
+
+@pytest.mark.parametrize('frame', [
+    b'0 -5\nabc',  # negative length
+    b'1\nx',       # no request id
+    b'0 1 1\nx',   # too many fields
+])
+def test_malformed_frame_closes_connection(server, frame):
+    assert server.send(pdc.MAGIC + frame) == b''
+    assert server.alive()
+    with pdc.Session() as session:
+        assert session.request('1')[0] == pdc.STATUS_OK
+
+def test_request_not_utf8(server):
+    sock = server.connect()
+    with sock:
+        sock.sendall(pdc.MAGIC + b'7 2\n\xff\xfe')
+        frames, _ = pdc.decode_frames(sock.recv(65536))
+    assert frames[0][0] == ['7', pdc.STATUS_ERR]
+    assert server.alive()
@@ -0,0 +1,28 @@
+import os
+import subprocess
+import sys
+
+import pdc
+
+from conftest import ROOT, wait_for
+
+def test_restart_keeps_objects(server):
+    with pdc.Client() as client:
+        timer = client.add('@h 1h -- true')
+        client.counter('@hc 7')
+        before = client.ls()
+    with open(os.path.join(server.home, 'new.log'), 'w') as log:
+        new = subprocess.Popen([sys.executable, os.path.join(ROOT, 'polydown'), '-r'],
+                               env=dict(os.environ, HOME=server.home),
+                               stdout=log, stderr=subprocess.STDOUT)
+        try:
+            # The old server exits once it handed over
+            assert wait_for(lambda: not server.alive())
+            with pdc.Client() as client:
+                assert client.ls() == before
+                assert client.cat('@hc') == ['7']
+                assert client.rm(str(timer)) == 1
+        finally:
+            with pdc.Session() as session:
+                session.request('kill')
+            new.wait(10)
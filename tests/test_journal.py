@@ -0,0 +1,40 @@
+from time import monotonic, time
+
+import pytest
+
+@pytest.fixture
+def journal(polydown, tmp_path):
+    return polydown.Journal(str(tmp_path / 'snapshot'), str(tmp_path / 'journal'))
+
+def write(path, *lines, end='\n'):
+    with open(path, 'w') as f:
+        f.write('\n'.join(lines) + end)
+
+def test_encode_decode(polydown):
+    now = monotonic()
+    offset = time() - now
+    timer = polydown.TimeObject(polydown.OBJECT['timer'], '@t', 'echo\tdone')
+    timer.index, timer.start, timer.deadline = 3, now, now + 60
+    timer.colors = ((0.0, 10.0, '#f00', None),)
+    fields = polydown.Journal.encode(timer, offset).split('\t')
+    copy = polydown.Journal.decode(fields, offset, 0, now)
+    assert (copy.index, copy.label, copy.command, tuple(copy.colors)) == (3, '@t', 'echo\tdone', timer.colors)
+    assert copy.deadline == pytest.approx(timer.deadline)
+
+def test_restore_replays_journal(journal):
+    wall = time()
+    write(journal.snapshot_path, 'T\t{!r}'.format(wall),
+          'A\t0\t3\t@a\t\t1.0\t\t', 'A\t1\t3\t@b\t\t2.0\t\t')
+    write(journal.journal_path, 'A\t0\t3\t@a\t\t5.0\t\t', 'R\t1', 'T\t{!r}'.format(wall))
+    objs = journal.restore()
+    assert [(o.index, o.value) for o in objs] == [(0, 5.0)]
+
+def test_restore_skips_torn_record(journal):
+    wall = time()
+    write(journal.snapshot_path, 'T\t{!r}'.format(wall),
+          'A\t0\t0\t@t\t\t{!r}\t{!r}\t'.format(wall + 60, wall))
+    # A crash in the middle of appending a heartbeat
+    write(journal.journal_path, 'A\t1\t3\t@c\t\t1.0\t\t', 'T\t17', end='')
+    objs = journal.restore()
+    assert [o.index for o in objs] == [0, 1]
+    assert objs[0].deadline - monotonic() == pytest.approx(60, abs=1)
@@ -0,0 +1,10 @@
+'''One-shot legacy messages: a raw message, a raw reply, then hang up'''
+
+def test_legacy_request(server):
+    assert server.send(b'0 0 @t 60').startswith(b'Added timer')
+    assert b'@t' in server.send(b'1')
+
+def test_legacy_request_not_utf8(server):
+    server.send(b'0 0 @t \xff')
+    assert server.alive()
+    assert server.send(b'0 0 @u 60').startswith(b'Added timer')
@@ -0,0 +1,27 @@
+import os
+
+def test_page_replaces_symlink(polydown, tmp_path):
+    victim = tmp_path / 'victim'
+    victim.write_text('precious')
+    path = tmp_path / 'status'
+    path.symlink_to(victim)
+    page = polydown.StatusPage(str(path))
+    try:
+        assert not path.is_symlink()
+        assert victim.read_text() == 'precious'
+    finally:
+        page.close()
+    assert not path.exists()
+
+def test_page_keeps_old_mapping(polydown, tmp_path):
+    path = str(tmp_path / 'status')
+    old = polydown.StatusPage(path)
+    inode = os.stat(path).st_ino
+    new = polydown.StatusPage(path)
+    try:
+        # The new page is a new file, the old one keeps its size
+        assert os.stat(path).st_ino != inode
+        assert os.fstat(old.fd).st_size == os.stat(path).st_size
+    finally:
+        old.close(unlink=False)
+        new.close()
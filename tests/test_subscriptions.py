@@ -0,0 +1,23 @@
+import pytest
+
+import pdc
+
+from conftest import wait_for
+
+@pytest.mark.parametrize('key', ['x:y', '-3:', 'abc'])
+def test_invalid_keys(server, key):
+    with pytest.raises(ValueError):
+        next(pdc.subscribe([key]))
+    assert server.alive()
+
+def test_kill_ends_every_subscription(server):
+    with pdc.Session() as session:
+        session.request('0 0 @k 60')
+    subscriptions = [pdc.subscribe(['@k']) for _ in range(3)]
+    for sub in subscriptions:
+        assert next(sub).startswith('k ')
+    server.send(b'kill')
+    assert wait_for(lambda: not server.alive(), timeout=3)
+    for sub in subscriptions:
+        # Each one gets its end of stream instead of another line
+        assert list(sub) == []
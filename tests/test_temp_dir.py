@@ -0,0 +1,27 @@
+import os
+
+import pytest
+
+import pdc
+
+def test_created_private(monkeypatch, tmp_path):
+    path = str(tmp_path / 'polydown') + '/'
+    monkeypatch.setattr(pdc, 'TEMP_DIR', path)
+    pdc.check_temp_dir(create=True)
+    assert os.stat(path).st_mode & 0o777 == 0o700
+
+@pytest.mark.parametrize('mode', [0o777, 0o770, 0o1777])
+def test_writable_by_others(monkeypatch, tmp_path, mode):
+    path = tmp_path / 'polydown'
+    path.mkdir()
+    path.chmod(mode)
+    monkeypatch.setattr(pdc, 'TEMP_DIR', str(path) + '/')
+    with pytest.raises(PermissionError):
+        pdc.check_temp_dir(create=True)
+
+def test_symlink(monkeypatch, tmp_path):
+    (tmp_path / 'elsewhere').mkdir(mode=0o700)
+    (tmp_path / 'polydown').symlink_to(tmp_path / 'elsewhere')
+    monkeypatch.setattr(pdc, 'TEMP_DIR', str(tmp_path / 'polydown') + '/')
+    with pytest.raises(PermissionError):
+        pdc.check_temp_dir()